@@ -4,16 +4,30 @@ Modulo di integrazione tra Orpheus TTS e Cheshire Cat.
 Utilizza l'approccio diretto con Ollama per la generazione di token custom.
 """
 
+import functools
+import hashlib
 import os
 import re
+import shutil
 import subprocess
+import sys
+import tempfile
 import threading
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+if os.name == 'nt':
+    import winsound
 
 from cat.log import log
 from cat.mad_hatter.decorators import hook
 
+try:
+    from cat.mad_hatter.decorators import plugin
+except ImportError:  # Versioni del Cat senza hook di attivazione/disattivazione
+    plugin = None
+
 from .orpheus_settings import (
     OrpheusSettings, 
     get_default_settings,
@@ -21,23 +35,182 @@ from .orpheus_settings import (
     OrpheusVoice,
     OrpheusEmotion,
     OrpheusFormat,
-    OrpheusMode
+    OrpheusMode,
+    AVAILABLE_VOICES,
+    AVAILABLE_EMOTIONS,
+    AVAILABLE_FORMATS,
+    VOICE_SET,
+    EMOTION_SET,
+    FORMAT_SET
 )
 from .orpheus_engine import OrpheusEngine, create_engine
 
 
+# === PATTERN PRECOMPILATI ===
+
+# Motore regex per il pattern unico, in ordine di preferenza:
+# - `re2` (google-re2): automa a tempo lineare, nessun backtracking possibile
+# - `regex`: quantificatori possessivi ("++") contro il backtracking sul
+#   markdown malformato
+# - `re` standard: possessivi solo da Python 3.11
+try:
+    import re2 as _re_engine
+    _POSSESSIVE = ''
+except ImportError:
+    try:
+        import regex as _re_engine
+        _POSSESSIVE = '+'
+    except ImportError:
+        _re_engine = re
+        _POSSESSIVE = '+' if sys.version_info >= (3, 11) else ''
+
+# Abbreviazioni comuni italiane
+_ABBREVIATIONS = {
+    'Dr.': 'Dottore',
+    'Prof.': 'Professore',
+    'Sig.': 'Signore',
+    'Sig.ra': 'Signora',
+    'Ing.': 'Ingegnere',
+    'Avv.': 'Avvocato',
+}
+
+# Alternativa unica, dalla più lunga: "Sig.ra" ha la precedenza su "Sig."
+_ABBREVIATIONS_PATTERN = '|'.join(
+    re.escape(abbreviation) for abbreviation in sorted(_ABBREVIATIONS, key=len, reverse=True)
+)
+
+# **grassetto** rimosso in un passaggio completo prima del resto del markup: in
+# un'unica alternanza il ramo del corsivo accoppierebbe un "*" isolato (es. elenchi
+# puntati "* **Nota:** ...") con l'apertura del grassetto
+_RE_BOLD = _re_engine.compile(rf'\*\*([^*]+{_POSSESSIVE})\*\*')
+
+# Markup restante (tag HTML, corsivo, codice, link) in una sola scansione
+_RE_MARKUP = _re_engine.compile(
+    rf'(?P<html><[^>]+{_POSSESSIVE}>)'                          # Tag HTML
+    # *corsivo*: come in markdown niente spazi dopo l'apertura o prima della chiusura,
+    # così gli "*" degli elenchi puntati non fanno coppia tra loro
+    rf'|\*(?P<italic>[^*\s]+{_POSSESSIVE}(?:\s+{_POSSESSIVE}[^*\s]+{_POSSESSIVE})*{_POSSESSIVE})\*'
+    rf'|`(?P<code>[^`]+{_POSSESSIVE})`'                         # `codice`
+    rf'|\[(?P<link>[^\]]+{_POSSESSIVE})\]\([^)]+{_POSSESSIVE}\)'   # [link](url)
+)
+
+# Abbreviazioni e simboli, su testo già privo di markup: "*50*%" e "<b>30</b>°"
+# diventano "50%" e "30°" prima di essere espansi, come con i vecchi passaggi
+_RE_SPOKEN = _re_engine.compile(
+    rf'\b(?P<abbreviation>{_ABBREVIATIONS_PATTERN})'            # Dr. Prof. ...
+    r'|\b(?P<number>\d+)(?P<unit>[°%€])'                       # 30° 20% 15€
+    r'|\$(?P<dollars>\d+)(?P<dollars_unit>[°%€])?'              # $5 ($5% come prima: "5 dollari percento")
+)
+
+# Rileva se il testo richiede pulizia: se nessuno di questi elementi è presente
+# (markup, caratteri da tradurre, spazi irregolari, abbreviazioni, numeri con
+# simbolo) il testo può essere restituito così com'è.
+_RE_NEEDS_WORK = re.compile(
+    r'[<*`\[\x00-\x1F\x7F-\x9F\u2013\u2014\u2018\u2019\u201A\u201C-\u201E\u2026]'
+    r'|[^\S ]|  '
+    rf'|\b(?:{_ABBREVIATIONS_PATTERN})'
+    r'|\d[°%€]|\$\d'
+)
+
+# Caratteri sostituiti/rimossi carattere per carattere con str.translate
+_PUNCTUATION_TABLE = str.maketrans({
+    '\u2026': '...',                                # …
+    '\u201C': '"', '\u201D': '"', '\u201E': '"',    # "",",„
+    '\u2018': "'", '\u2019': "'", '\u201A': "'",    # '',',`
+    '\u2013': '-', '\u2014': '-',                   # –,—
+    # Caratteri di controllo problematici
+    **{chr(c): None for c in (*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), *range(0x7F, 0xA0))},
+})
+
+# Unità pronunciate dopo un numero
+_UNITS = {
+    '°': 'gradi',
+    '%': 'percento',
+    '€': 'euro',
+}
+
+
+def _markup_replace(match: re.Match) -> str:
+    """🔀 Sostituzione per _RE_MARKUP in base al gruppo che ha fatto match"""
+    kind = match.lastgroup
+    if kind == 'html':
+        return ''
+    # Il contenuto del markdown può contenere altro markup
+    return _RE_MARKUP.sub(_markup_replace, match.group(kind))
+
+
+def _spoken_replace(match: re.Match) -> str:
+    """🔀 Sostituzione per _RE_SPOKEN in base al gruppo che ha fatto match"""
+    kind = match.lastgroup
+    if kind == 'abbreviation':
+        return _ABBREVIATIONS[match.group(kind)]
+    elif kind == 'unit':
+        return f"{match.group('number')} {_UNITS[match.group(kind)]}"
+    unit = match.group('dollars_unit')
+    if unit:
+        return f"{match.group('dollars')} dollari {_UNITS[unit]}"
+    return f"{match.group('dollars')} dollari"
+
+
+# === MAPPATURA IMPOSTAZIONI CAT ===
+
+# Parametri configurabili dall'interfaccia Cat
+_CAT_SETTINGS_FIELDS = (
+    "ollama_url",
+    "voice",
+    "emotion",
+    "speed",
+    "format",
+    "save_audio_files",
+    "enable_debug",
+    "enable_tts",
+)
+
+# Valori ammessi per i campi a scelta: quelli sconosciuti (es. salvati da una
+# versione precedente del plugin) vengono ignorati invece di invalidare tutto
+_CAT_CHOICE_FIELDS = {
+    "voice": VOICE_SET,
+    "emotion": EMOTION_SET,
+    "format": FORMAT_SET,
+}
+
+
 # === CONFIGURAZIONE GLOBALE ===
 
 # Istanza globale del motore Orpheus
 _orpheus_engine: Optional[OrpheusEngine] = None
 _engine_lock = threading.Lock()
 
+# Settings Orpheus mappate da quelle del Cat, invalidate al salvataggio
+_cached_settings: Optional[OrpheusSettings] = None
+# Incrementato a ogni salvataggio: una mappatura iniziata prima non va memorizzata
+_settings_generation = 0
+
+# Directory dei file audio generati e parametri di pulizia
+_AUDIO_DIR = Path(tempfile.gettempdir()) / "orpheus_tts"
+_AUDIO_DIR_MAX_BYTES = 100 * 1024 * 1024  # 100 MB
+_AUDIO_FILE_TTL = 24 * 60 * 60  # File non riusati da un giorno
+_AUDIO_JANITOR_INTERVAL = 30  # Secondi tra due pulizie
+
+# Comando del player audio ("{}" = file), risolto al primo utilizzo.
+# Lista vuota se nessun player è disponibile.
+_PLAYER_CMD: Optional[List[str]] = None
+
+# Player che accettano PCM grezzo (16 bit mono) da stdin per lo streaming
+_STREAM_PLAYERS = {
+    'aplay': ['-q', '-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', '{rate}', '-'],
+    'paplay': ['--raw', '--format=s16le', '--channels=1', '--rate={rate}'],
+}
+_STREAM_PLAYER_CMD: Optional[List[str]] = None
+
 
 def get_orpheus_engine() -> Optional[OrpheusEngine]:
-    """🔧 Ottiene l'istanza globale del motore Orpheus"""
-    global _orpheus_engine
-    with _engine_lock:
-        return _orpheus_engine
+    """🔧 Ottiene l'istanza globale del motore Orpheus
+    
+    La lettura di un riferimento globale è atomica: il lock serve solo
+    a inizializzazione e reset.
+    """
+    return _orpheus_engine
 
 
 def init_orpheus_engine(settings: OrpheusSettings) -> bool:
@@ -46,7 +219,11 @@ def init_orpheus_engine(settings: OrpheusSettings) -> bool:
     
     try:
         with _engine_lock:
+            previous_engine = _orpheus_engine
             _orpheus_engine = create_engine(settings)
+        
+        if previous_engine:
+            previous_engine.close()
             
         if settings.enable_debug:
             log.info("🔧 Motore Orpheus inizializzato con successo")
@@ -80,14 +257,14 @@ def settings_schema():
                     "type": "string",
                     "title": "🎤 Voce",
                     "description": "Voce da utilizzare per la sintesi",
-                    "enum": [voice.value for voice in OrpheusVoice],
+                    "enum": list(AVAILABLE_VOICES),
                     "default": OrpheusVoice.tara.value
                 },
                 "emotion": {
                     "type": "string",
                     "title": "😊 Emozione",
                     "description": "Emozione da applicare alla voce",
-                    "enum": [emotion.value for emotion in OrpheusEmotion],
+                    "enum": list(AVAILABLE_EMOTIONS),
                     "default": OrpheusEmotion.neutral.value
                 },
                 "speed": {
@@ -102,9 +279,15 @@ def settings_schema():
                     "type": "string",
                     "title": "🎧 Formato Audio",
                     "description": "Formato del file audio generato",
-                    "enum": [fmt.value for fmt in OrpheusFormat],
+                    "enum": list(AVAILABLE_FORMATS),
                     "default": OrpheusFormat.wav.value
                 },
+                "save_audio_files": {
+                    "type": "boolean",
+                    "title": "💾 Salva file audio",
+                    "description": "Salva e riusa i file audio generati; se disattivato l'audio viene riprodotto in streaming (aplay/paplay)",
+                    "default": True
+                },
                 
                 # === DEBUG E CONTROLLO ===
                 "enable_debug": {
@@ -126,110 +309,214 @@ def settings_schema():
 
 # === FUNZIONI UTILITY ===
 
+@functools.lru_cache(maxsize=512)
 def clean_text_for_tts(text: str) -> str:
-    """🧹 Pulisce il testo per TTS ottimale usando librerie specializzate"""
+    """🧹 Pulisce il testo per TTS ottimale
+    
+    Il risultato è memorizzato in cache: le risposte del Cat si ripetono spesso
+    (saluti, conferme) e la pulizia è deterministica.
+    """
     if not text:
         return ""
     
-    try:
-        import bleach
-        
-        # Rimuovi tutti i tag HTML mantenendo solo il testo
-        text = bleach.clean(text, tags=[], strip=True)
-        
-    except ImportError:
-        # Fallback per rimozione HTML se bleach non è disponibile
-        text = re.sub(r'<[^>]+>', '', text)
-    
-    # Gestisci markdown (sempre necessario, anche con bleach)
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)  # Link markdown
+    # Percorso rapido: testo già pulito, nessun passaggio necessario
+    if not _RE_NEEDS_WORK.search(text):
+        return text.strip()
     
-    # Rimuovi caratteri speciali problematici
-    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text)
+    # Normalizza punteggiatura e rimuovi caratteri speciali problematici
+    text = text.translate(_PUNCTUATION_TABLE)
     
-    # Normalizza punteggiatura
-    text = re.sub(r'\u2026', '...', text)  # …
-    text = re.sub(r'[\u201C\u201D\u201E]', '"', text)  # "",",„
-    text = re.sub(r'[\u2018\u2019\u201A]', "'", text)  # '',',`
-    text = re.sub(r'[\u2013\u2014]', '-', text)  # –,—
+    # Grassetto prima di tutto il resto, poi tag HTML e markdown restante,
+    # infine abbreviazioni e numeri sul testo già ripulito
+    text = _RE_BOLD.sub(r'\1', text)
+    text = _RE_MARKUP.sub(_markup_replace, text)
+    text = _RE_SPOKEN.sub(_spoken_replace, text)
     
     # Normalizza spazi
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-    
-    # Gestisci abbreviazioni comuni italiane
-    text = re.sub(r'\bDr\.', 'Dottore', text)
-    text = re.sub(r'\bProf\.', 'Professore', text)
-    text = re.sub(r'\bSig\.', 'Signore', text)
-    text = re.sub(r'\bSig\.ra', 'Signora', text)
-    text = re.sub(r'\bIng\.', 'Ingegnere', text)
-    text = re.sub(r'\bAvv\.', 'Avvocato', text)
-    
-    # Migliora pronuncia numeri e simboli
-    text = re.sub(r'\b(\d+)°', r'\1 gradi', text)
-    text = re.sub(r'\b(\d+)%', r'\1 percento', text)
-    text = re.sub(r'\b(\d+)€', r'\1 euro', text)
-    text = re.sub(r'\$(\d+)', r'\1 dollari', text)
+    text = ' '.join(text.split())
     
     return text
 
 
+def _clean_cache_clear() -> None:
+    """🧽 Svuota la cache di clean_text_for_tts (es. se cambiano le regole)"""
+    clean_text_for_tts.cache_clear()
+
+
 def map_cat_settings_to_orpheus(cat_settings: Dict[str, Any]) -> OrpheusSettings:
     """🗺️ Mappa le impostazioni di Cheshire Cat a quelle di Orpheus"""
     orpheus_config = cat_settings.get("orpheus_tts", {})
     
-    # Crea settings Orpheus base e aggiorna solo i valori presenti in Cat
-    settings = OrpheusSettings()
+    # Solo i parametri configurabili dall'interfaccia Cat, validati in un colpo solo
+    # (gli altri restano ai valori di default)
+    overrides = {key: orpheus_config[key] for key in _CAT_SETTINGS_FIELDS if key in orpheus_config}
+    for key, allowed in _CAT_CHOICE_FIELDS.items():
+        if key in overrides and (not isinstance(overrides[key], str) or overrides[key] not in allowed):
+            log.warning(f"⚠️ Valore non valido per {key}: {overrides.pop(key)!r}, uso il default")
+    return validate_settings(overrides)
+
+
+def get_audio_file_path(audio_dir: Path, text: str, settings: OrpheusSettings) -> Path:
+    """🔑 Percorso del file audio, indirizzato dal contenuto
     
-    # Aggiorna solo i parametri configurabili dall'interfaccia Cat
-    if "ollama_url" in orpheus_config:
-        settings.ollama_url = orpheus_config["ollama_url"]
-    if "voice" in orpheus_config:
-        settings.voice = OrpheusVoice(orpheus_config["voice"])
-    if "emotion" in orpheus_config:
-        settings.emotion = OrpheusEmotion(orpheus_config["emotion"])
-    if "speed" in orpheus_config:
-        settings.speed = orpheus_config["speed"]
-    if "format" in orpheus_config:
-        settings.format = OrpheusFormat(orpheus_config["format"])
-    if "enable_debug" in orpheus_config:
-        settings.enable_debug = orpheus_config["enable_debug"]
-    if "enable_tts" in orpheus_config:
-        settings.enable_tts = orpheus_config["enable_tts"]
+    Lo stesso testo con gli stessi parametri vocali produce sempre lo stesso
+    file, che può quindi essere riutilizzato senza una nuova sintesi.
+    """
+    audio_format = OrpheusFormat(settings.format).value
+    key = "|".join((
+        text,
+        OrpheusVoice(settings.voice).value,
+        OrpheusEmotion(settings.emotion).value,
+        str(settings.speed),
+        audio_format
+    )).encode()
+    digest = hashlib.blake2b(key, digest_size=16).hexdigest()
+    return audio_dir / f"orpheus_{digest}.{audio_format}"
+
+
+def prune_audio_dir(audio_dir: Path, max_bytes: int = _AUDIO_DIR_MAX_BYTES,
+                    max_age: Optional[float] = None) -> None:
+    """🧹 Rimuove i file audio usati meno di recente oltre max_bytes
     
+    Se max_age è indicato rimuove anche i file non usati da più di max_age secondi.
+    """
+    try:
+        files = []
+        total_size = 0
+        oldest_allowed = time.time() - max_age if max_age is not None else None
+        for path in audio_dir.glob("orpheus_*"):
+            stat = path.stat()
+            if oldest_allowed is not None and stat.st_mtime < oldest_allowed:
+                path.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        
+        if total_size <= max_bytes:
+            return
+        
+        # Il più vecchio per primo: mtime viene aggiornato a ogni riuso
+        files.sort()
+        for _, size, path in files:
+            if total_size <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            
+    except Exception as e:
+        log.warning(f"⚠️ Errore pulizia directory audio: {str(e)}")
+
+
+# Thread di pulizia: avviato al primo uso della directory audio, fermato con il suo evento
+_janitor_lock = threading.Lock()
+_janitor_stop: Optional[threading.Event] = None
+
+
+def _audio_janitor(stop: threading.Event) -> None:
+    """🧹 Thread unico che pulisce periodicamente la directory audio finché stop non è impostato"""
+    while not stop.wait(_AUDIO_JANITOR_INTERVAL):
+        if _AUDIO_DIR.exists():
+            prune_audio_dir(_AUDIO_DIR, max_age=_AUDIO_FILE_TTL)
+
+
+def start_audio_janitor() -> None:
+    """🧹 Avvia il thread di pulizia, una sola volta"""
+    global _janitor_stop
+    with _janitor_lock:
+        if _janitor_stop is None:
+            _janitor_stop = threading.Event()
+            threading.Thread(
+                target=_audio_janitor,
+                args=(_janitor_stop,),
+                name="orpheus-audio-janitor",
+                daemon=True
+            ).start()
+
+
+def stop_audio_janitor() -> None:
+    """🛑 Ferma il thread di pulizia (se attivo); verrà riavviato al prossimo uso"""
+    global _janitor_stop
+    with _janitor_lock:
+        if _janitor_stop is not None:
+            _janitor_stop.set()
+            _janitor_stop = None
+
+
+def _resolve_player() -> List[str]:
+    """🔎 Determina una sola volta il player audio di sistema (Linux/Mac)"""
+    global _PLAYER_CMD
+    if _PLAYER_CMD is None:
+        # Prova diversi player audio
+        _PLAYER_CMD = []
+        for player in ('aplay', 'paplay', 'afplay', 'play'):
+            player_path = shutil.which(player)
+            if player_path:
+                _PLAYER_CMD = [player_path, "{}"]
+                break
+    return _PLAYER_CMD
+
+
+def _resolve_stream_player() -> List[str]:
+    """🔎 Determina una sola volta il player per lo streaming PCM ("{rate}" = sample rate)"""
+    global _STREAM_PLAYER_CMD
+    if _STREAM_PLAYER_CMD is None:
+        _STREAM_PLAYER_CMD = []
+        for player, args in _STREAM_PLAYERS.items():
+            player_path = shutil.which(player)
+            if player_path:
+                _STREAM_PLAYER_CMD = [player_path, *args]
+                break
+    return _STREAM_PLAYER_CMD
+
+
+def get_message_text(message) -> str:
+    """📨 Estrae il testo dal messaggio del Cat (stringa, oggetto con content o dict)"""
+    if isinstance(message, str):
+        return message
+    content = getattr(message, "content", None)
+    if content is None and isinstance(message, dict):
+        content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def get_orpheus_settings(cat) -> OrpheusSettings:
+    """⚙️ Settings Orpheus correnti, mappate dal Cat solo dopo un salvataggio"""
+    global _cached_settings
+    settings = _cached_settings
+    if settings is None:
+        generation = _settings_generation
+        settings = map_cat_settings_to_orpheus(cat.mad_hatter.get_plugin_settings())
+        with _engine_lock:
+            # Un salvataggio concorrente ha già invalidato questa lettura
+            if generation == _settings_generation:
+                _cached_settings = settings
     return settings
 
 
-def play_audio_file(audio_file: str, settings: OrpheusSettings) -> bool:
+def play_audio_file(audio_file: Path, settings: OrpheusSettings) -> bool:
     """🔊 Riproduce file audio usando il player di sistema"""
-    if not os.path.exists(audio_file):
+    try:
+        # Path() accetta anche i chiamanti che passano ancora una str
+        Path(audio_file).stat()
+    except FileNotFoundError:
         log.error(f"🚨 File audio non trovato: {audio_file}")
         return False
+    except OSError as e:
+        log.error(f"🚨 File audio non accessibile: {audio_file} ({str(e)})")
+        return False
     
     try:
         if settings.enable_debug:
             log.info(f"🔊 Riproduzione audio: {audio_file}")
         
-        # Determina comando di riproduzione basato su OS
         if os.name == 'nt':  # Windows
-            # Usa PowerShell per riprodurre audio
-            cmd = [
-                "powershell", "-c",
-                f"(New-Object Media.SoundPlayer '{audio_file}').PlaySync()"
-            ]
-        else:  # Linux/Mac
-            # Prova diversi player audio
-            players = ['aplay', 'paplay', 'afplay', 'play']
-            cmd = None
-            for player in players:
-                if subprocess.run(['which', player], capture_output=True).returncode == 0:
-                    cmd = [player, audio_file]
-                    break
-        
-        if cmd:
+            # API PlaySound nel processo: asincrona, nessun avvio di PowerShell
+            winsound.PlaySound(str(audio_file), winsound.SND_FILENAME | winsound.SND_ASYNC)
+            return True
+        
+        player_cmd = _resolve_player()
+        if player_cmd:
+            cmd = [arg.format(audio_file) for arg in player_cmd]
             # Esegui in background per non bloccare
             subprocess.Popen(
                 cmd,
@@ -246,6 +533,33 @@ def play_audio_file(audio_file: str, settings: OrpheusSettings) -> bool:
         return False
 
 
+def stream_audio(engine: OrpheusEngine, text: str, settings: OrpheusSettings) -> bool:
+    """🌊 Genera e riproduce audio in streaming, senza file intermedi"""
+    try:
+        cmd = [arg.format(rate=settings.sample_rate) for arg in _resolve_stream_player()]
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            for chunk in engine.generate_speech_stream(text):
+                process.stdin.write(chunk)
+        finally:
+            process.stdin.close()
+            # Siamo già su un thread dedicato: attendere il player evita processi zombie
+            process.wait()
+        
+        if settings.enable_debug:
+            log.info(f"✅ TTS in streaming completato: {text[:50]}...")
+        return True
+        
+    except Exception as e:
+        log.error(f"🚨 Errore streaming audio: {str(e)}")
+        return False
+
+
 # === HOOK PRINCIPALE CHESHIRE CAT ===
 
 @hook
@@ -256,9 +570,13 @@ def before_cat_sends_message(message, cat):
     Genera l'audio TTS del messaggio e lo riproduce.
     """
     try:
+        # Testo del messaggio: niente da sintetizzare se assente
+        text = get_message_text(message)
+        if not text:
+            return message
+        
         # Ottieni settings dal Cat
-        cat_settings = cat.mad_hatter.get_plugin_settings()
-        orpheus_settings = map_cat_settings_to_orpheus(cat_settings)
+        orpheus_settings = get_orpheus_settings(cat)
         
         # Controlla se TTS è abilitato
         if not orpheus_settings.enable_tts:
@@ -275,38 +593,66 @@ def before_cat_sends_message(message, cat):
             engine = get_orpheus_engine()
         
         # Pulisci testo per TTS
-        clean_text = clean_text_for_tts(message)
+        clean_text = clean_text_for_tts(text)
         if not clean_text:
             if orpheus_settings.enable_debug:
                 log.info("📝 Testo vuoto dopo pulizia, skip TTS")
             return message
         
         # Controlla lunghezza testo
-        if len(clean_text) > orpheus_settings.max_text_length:
+        if not orpheus_settings.check_text(clean_text):
             if orpheus_settings.enable_debug:
                 log.warning(f"📏 Testo troncato: {len(clean_text)} > {orpheus_settings.max_text_length}")
             clean_text = clean_text[:orpheus_settings.max_text_length]
         
-        # Genera nome file audio temporaneo
-        import tempfile
-        import time
-        timestamp = int(time.time() * 1000)
-        temp_dir = Path(tempfile.gettempdir()) / "orpheus_tts"
-        temp_dir.mkdir(exist_ok=True)
+        # Senza salvataggio dei file l'audio va direttamente al player
+        if not orpheus_settings.save_audio_files and _resolve_stream_player():
+            if orpheus_settings.enable_debug:
+                log.info(f"🌊 Generazione TTS in streaming per: {clean_text[:50]}...")
+            
+            threading.Thread(
+                target=stream_audio,
+                args=(engine, clean_text, orpheus_settings),
+                daemon=True
+            ).start()
+            return message
+        
+        if not orpheus_settings.save_audio_files and orpheus_settings.enable_debug:
+            log.info("💾 Nessun player per lo streaming (aplay/paplay): uso i file audio")
         
-        audio_file = temp_dir / f"orpheus_{timestamp}.{orpheus_settings.format.value}"
+        # File audio indirizzato dal contenuto: riusato se già generato
+        _AUDIO_DIR.mkdir(exist_ok=True)
+        start_audio_janitor()
+        audio_file = get_audio_file_path(_AUDIO_DIR, clean_text, orpheus_settings)
         
-        # Genera audio
-        if orpheus_settings.enable_debug:
-            log.info(f"🎵 Generazione TTS per: {clean_text[:50]}...")
+        try:
+            # Aggiorna mtime per l'ordine LRU di prune_audio_dir: una sola
+            # syscall che verifica anche l'esistenza del file
+            os.utime(audio_file)
+            cached = True
+        except FileNotFoundError:
+            cached = False
         
-        success = engine.generate_speech(clean_text, str(audio_file))
+        if cached:
+            success = True
+            if orpheus_settings.enable_debug:
+                log.info(f"💾 Audio già generato per: {clean_text[:50]}...")
+        else:
+            # Genera audio
+            if orpheus_settings.enable_debug:
+                log.info(f"🎵 Generazione TTS per: {clean_text[:50]}...")
+            
+            success = engine.generate_speech(clean_text, str(audio_file))
+            
+            if not success:
+                # Evita che un file parziale venga riusato come cache
+                audio_file.unlink(missing_ok=True)
         
-        if success and audio_file.exists():
+        if success:
             # Riproduce audio in background
             threading.Thread(
                 target=play_audio_file,
-                args=(str(audio_file), orpheus_settings),
+                args=(audio_file, orpheus_settings),
                 daemon=True
             ).start()
             
@@ -315,18 +661,6 @@ def before_cat_sends_message(message, cat):
         else:
             log.error("🚨 Errore generazione TTS")
         
-        # Cleanup file temporaneo dopo un po'
-        def cleanup_temp_file():
-            import time
-            time.sleep(10)  # Aspetta 10 secondi
-            try:
-                if audio_file.exists():
-                    audio_file.unlink()
-            except Exception:
-                pass
-        
-        threading.Thread(target=cleanup_temp_file, daemon=True).start()
-        
     except Exception as e:
         log.error(f"🚨 Errore hook TTS: {str(e)}")
     
@@ -357,9 +691,16 @@ def plugin_settings_save(settings):
             log.info("💾 Impostazioni Orpheus TTS salvate")
         
         # Reinizializza il motore con le nuove impostazioni
-        global _orpheus_engine
+        global _orpheus_engine, _cached_settings, _settings_generation
         with _engine_lock:
+            previous_engine = _orpheus_engine
             _orpheus_engine = None
+            _cached_settings = None
+            _settings_generation += 1
+        
+        if previous_engine:
+            previous_engine.close()
+        _clean_cache_clear()
         
         # Il motore verrà reinizializzato al prossimo utilizzo
         
@@ -367,6 +708,13 @@ def plugin_settings_save(settings):
         log.error(f"🚨 Errore salvataggio impostazioni: {str(e)}")
 
 
+if plugin is not None:
+    @plugin
+    def deactivated(plugin):
+        """🛑 Plugin disattivato: ferma il thread di pulizia della directory audio"""
+        stop_audio_janitor()
+
+
 # === FUNZIONI DI UTILITÀ PER DEBUG ===
 
 def get_plugin_status() -> Dict[str, Any]:
@@ -383,12 +731,39 @@ def get_plugin_status() -> Dict[str, Any]:
     return status
 
 
+# Casi di regressione per clean_text_for_tts: (input, output atteso)
+_CLEAN_TEXT_CASES = (
+    ("* **Nota:** il Dr. Rossi", "* Nota: il Dottore Rossi"),
+    ("- **Primo** punto\n- *secondo* punto", "- Primo punto - secondo punto"),
+    ("* uno\n* **due**\n* tre", "* uno * due * tre"),
+    ("2 * 3 = 6 e **grassetto**", "2 * 3 = 6 e grassetto"),
+    ("$1°", "1 dollari gradi"),
+    ("Costa $5 e 15€, fuori 30°", "Costa 5 dollari e 15 euro, fuori 30 gradi"),
+    ("<b>Ciao</b> [sito](http://x.it) `code`", "Ciao sito code"),
+    ("Sconto del *50*%", "Sconto del 50 percento"),
+    ("<b>30</b>°", "30 gradi"),
+    ("Costa `$`5", "Costa 5 dollari"),
+    ("[20](http://x)%", "20 percento"),
+)
+
+
+def test_text_cleaning() -> bool:
+    """🧪 Verifica clean_text_for_tts sui casi di regressione (elenchi puntati, simboli)"""
+    failures = [
+        (text, expected, clean_text_for_tts(text))
+        for text, expected in _CLEAN_TEXT_CASES
+        if clean_text_for_tts(text) != expected
+    ]
+    for text, expected, got in failures:
+        log.error(f"🚨 Pulizia testo errata: {text!r} -> {got!r} (atteso {expected!r})")
+    return not failures
+
+
 def test_tts_generation(text: str = "Ciao, questo è un test di Orpheus TTS") -> bool:
     """🧪 Test rapido di generazione TTS"""
     try:
         # Usa settings di default
-        settings = get_default_settings()
-        settings.enable_debug = True
+        settings = get_default_settings().model_copy(update={"enable_debug": True})
         
         # Inizializza motore
         if not init_orpheus_engine(settings):
@@ -399,7 +774,6 @@ def test_tts_generation(text: str = "Ciao, questo è un test di Orpheus TTS") ->
             return False
         
         # Test generazione
-        import tempfile
         temp_file = Path(tempfile.gettempdir()) / "orpheus_test.wav"
         
         success = engine.generate_speech(text, str(temp_file))
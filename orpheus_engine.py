@@ -8,10 +8,19 @@ import os
 import re
 import json
 import time
+import random
+import functools
+import shutil
+import struct
+import sys
 import hashlib
+import threading
 import requests
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
 from datetime import datetime
 
 try:
@@ -27,6 +36,158 @@ except ImportError:
     from orpheus_settings import OrpheusSettings, OrpheusMode, OrpheusVoice, OrpheusEmotion
 
 
+# === PATTERN PRECOMPILATI ===
+
+# Pattern usati da clean_text, compilati una sola volta al caricamento
+_RE_HTML_TAG = re.compile(r'<[^>]+>')
+_RE_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+_RE_ITALIC = re.compile(r'\*([^*]+)\*')
+_RE_CODE = re.compile(r'`([^`]+)`')
+
+# Token audio generati da Orpheus nella risposta Ollama (pattern bytes: solo cifre ASCII)
+_RE_CUSTOM_TOKEN = re.compile(rb'<custom_token_(\d+)>', re.ASCII)
+# Lunghezza oltre la quale un '<' senza '>' non può più diventare un custom_token
+_CUSTOM_TOKEN_TAIL_MAX = 64
+
+# Header WAV PCM (RIFF + fmt + data) impacchettato in una sola chiamata
+_WAV_FMT = struct.Struct('<4sI4s4sIHHIIHH4sI')
+_WAV_CHANNELS = 1
+_WAV_BITS_PER_SAMPLE = 16
+_WAV_WRITE_BUFFER = 64 * 1024
+
+
+def _pack_wav_header(data_size: int, sample_rate: int) -> bytes:
+    """🎧 Header WAV mono 16 bit di 44 byte per data_size byte di PCM"""
+    block_align = _WAV_CHANNELS * _WAV_BITS_PER_SAMPLE // 8
+    return _WAV_FMT.pack(
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, _WAV_CHANNELS, sample_rate,  # fmt chunk size, formato PCM
+        sample_rate * block_align, block_align, _WAV_BITS_PER_SAMPLE,
+        b'data', data_size,
+    )
+
+class _Stats:
+    """📊 Contatori del motore in __slots__ (niente dict per istanza, accesso per attributo)"""
+    # Slot scritti a mano: dataclass(slots=True) richiede Python 3.10, il plugin supporta 3.9+
+    __slots__ = ("requests_total", "requests_success", "requests_failed",
+                 "cache_hits", "tokens_generated", "last_request")
+    
+    def __init__(self):
+        self.requests_total = 0
+        self.requests_success = 0
+        self.requests_failed = 0
+        self.cache_hits = 0
+        self.tokens_generated = 0
+        self.last_request: Optional[str] = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """📊 Istantanea dei contatori come dict"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Prompt Orpheus: token speciali per modelli "larger" attorno a "voce: testo"
+_PROMPT_PREFIX = "<|reserved_special_token_250|>{voice}: "
+_PROMPT_SUFFIX = "<|end_of_text|><|reserved_special_token_251|><|reserved_special_token_252|><|reserved_special_token_248|>"
+
+# Sintesi concorrenti verso Ollama (generate_speech_async e generate_speech_batch)
+_MAX_WORKERS = 4
+
+# Pool di buffer float32 riusati tra le sintesi per ridurre le allocazioni sotto carico
+_AUDIO_BUFFER_POOL_SIZE = 8
+# Buffer più grandi (~24 s a 22050 Hz, 2 MiB) non tornano nel pool: al massimo 16 MiB trattenuti
+_AUDIO_BUFFER_MAX_SAMPLES = 1 << 19
+_audio_buffer_pool: deque = deque()
+_audio_buffer_pool_lock = threading.Lock()
+
+
+def _acquire_audio_buffer(num_samples: int) -> 'np.ndarray':
+    """♻️ Prende dal pool un buffer float32 di almeno num_samples campioni"""
+    with _audio_buffer_pool_lock:
+        buffer = _audio_buffer_pool.pop() if _audio_buffer_pool else None
+    if buffer is None or len(buffer) < num_samples:
+        buffer = np.empty(num_samples, dtype=np.float32)
+    return buffer
+
+
+def _release_audio_buffer(buffer: 'np.ndarray') -> None:
+    """♻️ Restituisce un buffer al pool (se troppo grande o oltre la capienza viene lasciato al GC)"""
+    if len(buffer) > _AUDIO_BUFFER_MAX_SAMPLES:
+        return
+    with _audio_buffer_pool_lock:
+        if len(_audio_buffer_pool) < _AUDIO_BUFFER_POOL_SIZE:
+            _audio_buffer_pool.append(buffer)
+
+
+def _enum_str(value: Any) -> str:
+    """🏷️ Valore stringa di un campo enum (use_enum_values lo salva già come str)"""
+    return getattr(value, 'value', value)
+
+
+def _ollama_base_url(url: str) -> str:
+    """🔗 URL base di Ollama senza il suffisso /v1 dell'API OpenAI-compatibile
+    
+    Non usa rstrip('/v1'), che toglie qualunque '/', 'v' o '1' finale (es. "http://host:11").
+    """
+    return url.rstrip('/').removesuffix('/v1')
+
+
+# Copia file interamente nel kernel (os.sendfile tra file regolari è garantito solo su Linux)
+_HAS_FILE_SENDFILE = sys.platform.startswith('linux') and hasattr(os, 'sendfile')
+
+
+def _remove_if_exists(path: str) -> None:
+    """🗑️ Rimuove path ignorando il caso in cui non esista"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _copy_file(src: str, dst: str) -> None:
+    """📋 Copia src in dst, con os.sendfile su Linux per evitare i buffer Python"""
+    if not _HAS_FILE_SENDFILE:
+        shutil.copy2(src, dst)
+        return
+    
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
+# Punteggiatura tipografica e caratteri di controllo, in un solo str.translate
+_PUNCTUATION_TABLE = str.maketrans({
+    '\u2026': '...',                                # …
+    '\u201C': '"', '\u201D': '"', '\u201E': '"',    # "",",„
+    '\u2018': "'", '\u2019': "'", '\u201A': "'",    # '',',`
+    # Caratteri di controllo problematici
+    **{chr(c): None for c in (*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), *range(0x7F, 0xA0))},
+})
+
+# Abbreviazioni comuni: "Sig.ra" prima di "Sig." per non produrre "Signorera"
+_ABBREVIATIONS = [
+    (re.compile(r'\bDr\.'), 'Dottore'),
+    (re.compile(r'\bProf\.'), 'Professore'),
+    (re.compile(r'\bSig\.ra'), 'Signora'),
+    (re.compile(r'\bSig\.'), 'Signore'),
+]
+
+# Numeri: (pattern, sostituzione)
+_NUMBER_SYMBOLS = [
+    (re.compile(r'\b(\d+)°'), r'\1 gradi'),
+    (re.compile(r'\b(\d+)%'), r'\1 percento'),
+]
+
+# Sonda per clean_text: se non trova nulla da pulire basta normalizzare gli spazi
+_RE_NEEDS_CLEAN = re.compile(
+    '[<*`°%' + re.escape(''.join(map(chr, _PUNCTUATION_TABLE))) + ']'
+    r'|\b(?:Dr|Prof|Sig)\.'
+)
+
+
 class OrpheusEngineError(Exception):
     """🚨 Eccezione personalizzata per errori del motore Orpheus"""
     pass
@@ -44,6 +205,8 @@ class OrpheusEngine:
     def __init__(self, settings: OrpheusSettings):
         """🏗️ Inizializza il motore Orpheus"""
         self.settings = settings
+        # Vista a slot dei campi letti nei percorsi caldi (sintesi, cache, rete)
+        self._runtime = settings.to_runtime()
         self.cache_dir = Path("/admin/assets/voice/cache")
         self.cache_enabled = settings.audio_cache_enabled
         
@@ -51,16 +214,46 @@ class OrpheusEngine:
         if self.cache_enabled:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
         
-        # Statistiche
-        self.stats = {
-            "requests_total": 0,
-            "requests_success": 0,
-            "requests_failed": 0,
-            "cache_hits": 0,
-            "tokens_generated": 0,
-            "last_request": None
+        # Indice in memoria dei file già presenti in cache: evita hash e stat sui testi ripetuti
+        self._cache_version = 0
+        self._cached_audio_index = functools.lru_cache(maxsize=512)(self._lookup_cached_audio)
+        
+        # Endpoint Ollama calcolati una sola volta
+        self._ollama_base = _ollama_base_url(settings.ollama_url)
+        self._generate_url = self._ollama_base + "/api/generate"
+        self._tags_url = self._ollama_base + "/api/tags"
+        
+        # Parte fissa della richiesta a Ollama: per ogni testo cambia solo "prompt"
+        self._prompt_prefix = _PROMPT_PREFIX.format(voice=self._runtime.voice)
+        self._payload_static = {
+            "model": _enum_str(settings.ollama_model),  # Modello configurato
+            "stream": True,
+            "options": {
+                "temperature": settings.voice_temperature,
+                "top_p": 0.9,
+                "num_predict": 2000,
+                "stop": ["<|end_of_text|>", "<|reserved_special_token_248|>"]
+            }
         }
         
+        # Sessione HTTP persistente: connessioni keep-alive riusate verso Ollama
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate",
+            "Content-Type": "application/json"
+        })
+        
+        # Pool di thread per le sintesi asincrone; i thread partono solo al primo submit
+        self._executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="orpheus-tts")
+        
+        # Statistiche, aggiornate anche dai thread del pool
+        self._stats_lock = threading.Lock()
+        self._stats = _Stats()
+        
         if settings.enable_debug:
             log.info(f"🔧 Orpheus Engine inizializzato: {settings}")
     
@@ -74,81 +267,216 @@ class OrpheusEngine:
         Returns:
             bool: True se successo, False altrimenti
         """
-        self.stats["requests_total"] += 1
-        self.stats["last_request"] = datetime.now().isoformat()
+        self._start_request()
         
         try:
-            # Pulizia e validazione testo
-            clean_text = self.clean_text(text)
+            clean_text = self._prepare_text(text)
             if not clean_text:
-                log.warning("🚨 Testo vuoto dopo pulizia")
                 return False
             
-            # Controllo lunghezza
-            if len(clean_text) > self.settings.max_text_length:
-                log.warning(f"🚨 Testo troppo lungo ({len(clean_text)} > {self.settings.max_text_length})")
-                clean_text = clean_text[:self.settings.max_text_length]
+            if self._serve_from_cache(clean_text, output_file):
+                return True
+            
+            return self._synthesize_to_file(clean_text, output_file)
             
-            # Controllo cache
+        except Exception as e:
+            self._count("requests_failed")
+            log.error(f"🚨 Errore generazione audio: {str(e)}")
+            return False
+    
+    def generate_speech_async(self, text: str, output_file: str) -> Future:
+        """🎵 Come generate_speech, ma eseguita sul pool di thread del motore
+        
+        Returns:
+            Future: risolto con True se successo, False altrimenti
+        """
+        return self._executor.submit(self.generate_speech, text, output_file)
+    
+    def generate_speech_batch(self, texts: List[str], output_files: List[str]) -> List[bool]:
+        """🎵 Genera audio per più testi con richieste Ollama concorrenti
+        
+        I testi già in cache vengono serviti subito; gli altri vengono inviati
+        a Ollama in parallelo sulla stessa sessione keep-alive.
+        
+        Args:
+            texts: Testi da sintetizzare
+            output_files: Percorsi file output, uno per testo
+            
+        Returns:
+            List[bool]: Esito per ciascun testo, nello stesso ordine
+        """
+        if len(texts) != len(output_files):
+            raise OrpheusEngineError("texts e output_files devono avere la stessa lunghezza")
+        
+        results = [False] * len(texts)
+        pending = []
+        
+        for index, (text, output_file) in enumerate(zip(texts, output_files)):
+            self._start_request()
+            
+            try:
+                clean_text = self._prepare_text(text)
+                if not clean_text:
+                    continue
+                
+                if self._serve_from_cache(clean_text, output_file):
+                    results[index] = True
+                else:
+                    pending.append((index, clean_text, output_file))
+                    
+            except Exception as e:
+                self._count("requests_failed")
+                log.error(f"🚨 Errore generazione audio: {str(e)}")
+        
+        futures = [
+            (index, self._executor.submit(self._synthesize_to_file, clean_text, output_file))
+            for index, clean_text, output_file in pending
+        ]
+        for index, future in futures:
+            results[index] = future.result()
+        
+        return results
+    
+    def _prepare_text(self, text: str) -> str:
+        """🧹 Pulisce il testo e lo tronca a max_text_length"""
+        # Pulizia e validazione testo
+        clean_text = self.clean_text(text)
+        if not clean_text:
+            log.warning("🚨 Testo vuoto dopo pulizia")
+            return ""
+        
+        # Controllo lunghezza
+        if not self.settings.check_text(clean_text):
+            log.warning(f"🚨 Testo troppo lungo ({len(clean_text)} > {self.settings.max_text_length})")
+            clean_text = clean_text[:self.settings.max_text_length]
+        
+        return clean_text
+    
+    def _serve_from_cache(self, clean_text: str, output_file: str) -> bool:
+        """💾 Copia l'audio dalla cache in output_file, se presente"""
+        if not self.cache_enabled:
+            return False
+        
+        cached_file = self._get_cached_audio(clean_text)
+        if not cached_file:
+            return False
+        
+        if self._copy_cached_file(cached_file, output_file):
+            self._count("cache_hits", "requests_success")
+            if self.settings.enable_debug:
+                log.info(f"💾 Cache hit per testo: {clean_text[:50]}...")
+            return True
+        
+        # File rimosso dall'esterno: invalida l'indice in memoria
+        self.invalidate_cache_index()
+        return False
+    
+    def _synthesize_to_file(self, clean_text: str, output_file: str) -> bool:
+        """🎛️ Sintetizza il testo già pulito in output_file e lo salva in cache"""
+        success = self._generate_audio_direct(clean_text, output_file)
+        
+        if success:
+            self._count("requests_success")
+            # Salva in cache se abilitata
             if self.cache_enabled:
-                cached_file = self._get_cached_audio(clean_text)
-                if cached_file and self._copy_cached_file(cached_file, output_file):
-                    self.stats["cache_hits"] += 1
-                    self.stats["requests_success"] += 1
-                    if self.settings.enable_debug:
-                        log.info(f"💾 Cache hit per testo: {clean_text[:50]}...")
-                    return True
+                self._save_to_cache(clean_text, output_file)
+        else:
+            self._count("requests_failed")
+        
+        return success
+    
+    def generate_speech_stream(self, text: str) -> Iterator[bytes]:
+        """🌊 Genera audio in streaming, senza passare dal disco
+        
+        Args:
+            text: Testo da sintetizzare
             
-            # Generazione audio
-            success = self._generate_audio_direct(clean_text, output_file)
+        Yields:
+            bytes: Blocchi PCM 16 bit little-endian mono a settings.sample_rate
+        """
+        self._start_request()
+        
+        try:
+            clean_text = self._prepare_text(text)
+            if not clean_text:
+                return
             
-            if success:
-                self.stats["requests_success"] += 1
-                # Salva in cache se abilitata
-                if self.cache_enabled:
-                    self._save_to_cache(clean_text, output_file)
-            else:
-                self.stats["requests_failed"] += 1
+            # L'audio parte con i primi 50 token, mentre Ollama sta ancora generando
+            produced = False
+            for pcm in self._iter_pcm_chunks(self._iter_custom_tokens(clean_text)):
+                produced = True
+                yield pcm
             
-            return success
+            self._count("requests_success" if produced else "requests_failed")
             
         except Exception as e:
-            self.stats["requests_failed"] += 1
-            log.error(f"🚨 Errore generazione audio: {str(e)}")
-            return False
+            self._count("requests_failed")
+            log.error(f"🚨 Errore generazione audio in streaming: {str(e)}")
     
-    def _generate_audio_direct(self, text: str, output_file: str) -> bool:
-        """🎛️ Generazione audio diretta con Ollama"""
+    def _generate_custom_tokens(self, text: str) -> Optional[List[int]]:
+        """🦙 Genera da Ollama tutti i token custom per il testo (simulati se assenti)"""
+        custom_tokens = [token for batch in self._iter_custom_tokens(text) for token in batch]
+        return custom_tokens or None
+    
+    def _iter_custom_tokens(self, text: str) -> Iterator[List[int]]:
+        """🦙 Token custom da Ollama a blocchi, man mano che arrivano
+        
+        Se la risposta contiene testo ma nessun token usa quelli simulati; se Ollama
+        fallisce (o risponde vuoto) prima di produrre token non restituisce nulla.
+        
+        Raises:
+            OrpheusEngineError: se lo stream si interrompe dopo i primi token
+                (l'audio sarebbe troncato: non va salvato né messo in cache)
+        """
+        if self.settings.enable_debug:
+            log.info(f"🦙 Generazione token Ollama per: {text[:50]}...")
+        
+        received = 0
         try:
-            # Step 1: Genera token da Ollama
-            if self.settings.enable_debug:
-                log.info(f"🦙 Generazione token Ollama per: {text[:50]}...")
+            for tokens in self._stream_tokens_from_ollama(text):
+                received += len(tokens)
+                yield tokens
             
-            token_response = self._generate_tokens_from_ollama(text)
-            if not token_response:
-                log.error("🚨 Nessuna risposta da Ollama")
-                return False
+            if self.settings.enable_debug:
+                log.info(f"🔍 Token estratti: {received}")
             
-            # Step 2: Estrai token custom
-            custom_tokens = self._extract_custom_tokens(token_response)
-            if not custom_tokens:
+            if not received:
                 log.warning("⚠️ Nessun token custom estratto, uso token simulati")
-                custom_tokens = self._generate_simulated_tokens(text)
-            
-            self.stats["tokens_generated"] = len(custom_tokens)
+                tokens = self._generate_simulated_tokens(text)
+                received = len(tokens)
+                yield tokens
+        except Exception as e:
+            log.error(f"🚨 Errore chiamata Ollama: {str(e)}")
+            if received:
+                raise OrpheusEngineError(f"Stream Ollama interrotto dopo {received} token") from e
+        finally:
+            if received:
+                with self._stats_lock:
+                    self._stats.tokens_generated = received
+    
+    def _generate_audio_direct(self, text: str, output_file: str) -> bool:
+        """🎛️ Generazione audio diretta con Ollama"""
+        try:
+            custom_tokens = self._generate_custom_tokens(text)
+            if not custom_tokens:
+                return False
             
             # Step 3: Converti token in audio
-            audio_data = self._convert_tokens_to_audio(custom_tokens)
-            if not audio_data:
+            converted = self._convert_tokens_to_audio(custom_tokens)
+            if converted is None:
                 log.error("🚨 Errore conversione token in audio")
                 return False
             
-            # Step 4: Salva file audio
-            with open(output_file, "wb") as f:
-                f.write(audio_data)
+            # Step 4: Salva file audio, header e PCM scritti direttamente senza blob intermedio
+            pcm = memoryview(converted[0])
+            # output_file potrebbe essere un hardlink alla cache: va sganciato, non troncato
+            _remove_if_exists(output_file)
+            with open(output_file, "wb", buffering=_WAV_WRITE_BUFFER) as f:
+                f.write(_pack_wav_header(pcm.nbytes, converted[1]))
+                f.write(pcm)
             
             if self.settings.enable_debug:
-                log.info(f"✅ Audio salvato: {output_file} ({len(audio_data)} bytes)")
+                log.info(f"✅ Audio salvato: {output_file} ({_WAV_FMT.size + pcm.nbytes} bytes)")
             
             return True
             
@@ -156,239 +484,229 @@ class OrpheusEngine:
             log.error(f"🚨 Errore generazione diretta: {str(e)}")
             return False
     
-    def _generate_tokens_from_ollama(self, text: str) -> Optional[str]:
-        """🦙 Genera token custom da Ollama usando il prompt originale"""
-        try:
-            # Formato prompt originale Orpheus
-            formatted_prompt = self._format_prompt_original(text, self.settings.voice.value)
-            
-            # Gestisce sia enum che stringa per ollama_model
-            model_name = self.settings.ollama_model.value if hasattr(self.settings.ollama_model, 'value') else str(self.settings.ollama_model)
-            
-            payload = {
-                "model": model_name,  # Modello configurato
-                "prompt": formatted_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": self.settings.voice_temperature,
-                    "top_p": 0.9,
-                    "num_predict": 2000,
-                    "stop": ["<|end_of_text|>", "<|reserved_special_token_248|>"]
-                }
-            }
-            
-            # Chiamata a Ollama
-            response = requests.post(
-                f"{self.settings.ollama_url.rstrip('/v1')}/api/generate",
-                json=payload,
-                timeout=self.settings.timeout_seconds
-            )
+    def _stream_tokens_from_ollama(self, text: str) -> Iterator[List[int]]:
+        """🦙 Genera token custom da Ollama in streaming usando il prompt originale
+        
+        Ogni riga NDJSON porta un frammento di testo: i token completi vengono
+        estratti subito, un eventuale token spezzato resta in coda per la riga dopo.
+        
+        Raises:
+            OrpheusEngineError: se Ollama segnala un errore nello stream (riga con
+                "error", anche con HTTP 200) o se la risposta non contiene testo
+        """
+        # Formato prompt originale Orpheus
+        payload = {**self._payload_static, "prompt": self._format_prompt_original(text)}
+        
+        # Chiamata a Ollama
+        with self._session.post(
+            self._generate_url,
+            json=payload,
+            timeout=self._runtime.timeout_seconds,
+            stream=True
+        ) as response:
             response.raise_for_status()
             
-            result = response.json()
-            generated_text = result.get('response', '')
-            
-            if self.settings.enable_debug:
-                log.info(f"📝 Risposta Ollama: {generated_text[:200]}...")
-            
-            return generated_text
+            pending = b''
+            has_text = False
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                
+                result = json.loads(line)
+                if 'error' in result:
+                    raise OrpheusEngineError(result['error'])
+                
+                fragment = result.get('response', '')
+                if fragment:
+                    has_text = True
+                    pending += fragment.encode('utf-8', 'ignore')
+                
+                # Tutto ciò che precede l'ultimo '<' non chiuso è già completo
+                cut = pending.rfind(b'<')
+                if cut < 0 or pending.find(b'>', cut) >= 0:
+                    cut = len(pending)
+                
+                if cut:
+                    tokens = self._extract_custom_tokens(pending[:cut])
+                    if tokens:
+                        yield tokens
+                
+                pending = pending[cut:]
+                if len(pending) > _CUSTOM_TOKEN_TAIL_MAX:
+                    pending = b''
+                
+                if result.get('done'):
+                    break
             
-        except Exception as e:
-            log.error(f"🚨 Errore chiamata Ollama: {str(e)}")
-            return None
+            if not has_text:
+                raise OrpheusEngineError("Risposta Ollama vuota")
     
-    def _format_prompt_original(self, text: str, voice: str) -> str:
+    def _format_prompt_original(self, text: str) -> str:
         """📝 Formatta il prompt usando il formato semplice del workspace core"""
-        # Formato semplificato dal workspace core - più diretto e funzionante
-        adapted_prompt = f"{voice}: {text}"
-        # Token speciali Orpheus per modelli "larger"
-        return f"<|reserved_special_token_250|>{adapted_prompt}<|end_of_text|><|reserved_special_token_251|><|reserved_special_token_252|><|reserved_special_token_248|>"
+        # Formato semplificato dal workspace core - più diretto e funzionante;
+        # la voce è fissa per la vita del motore, il prefisso è già pronto
+        return self._prompt_prefix + text + _PROMPT_SUFFIX
     
-    def _extract_custom_tokens(self, token_response: str) -> List[int]:
-        """🔍 Estrai token custom dalla risposta Ollama"""
+    def _extract_custom_tokens(self, token_response: bytes) -> List[int]:
+        """🔍 Estrai token custom da un frammento della risposta Ollama (UTF-8)"""
         if not token_response:
             return []
         
-        extracted_tokens = []
-        
         # Cerca tutti i custom_token nella risposta usando regex
-        tokens = re.findall(r'<custom_token_(\d+)>', token_response)
-        for token_num in tokens:
-            try:
-                token_id = int(token_num)
-                # Applica la formula originale: (token_id - 32000) % 4096
-                converted_id = (token_id - 32000) % 4096
-                if 0 <= converted_id <= 4096:
-                    extracted_tokens.append(converted_id)
-            except ValueError:
-                continue
+        tokens = _RE_CUSTOM_TOKEN.findall(token_response)
         
-        if self.settings.enable_debug:
-            log.info(f"🔍 Token estratti: {len(extracted_tokens)}")
+        # Applica la formula originale: (token_id - 32000) % 4096
+        # (il modulo restituisce sempre un valore in 0..4095)
+        if np is not None:
+            token_ids = np.fromiter(map(int, tokens), dtype=np.int64, count=len(tokens))
+            extracted_tokens = np.mod(token_ids - 32000, 4096).tolist()
+        else:
+            extracted_tokens = [(int(token_num) - 32000) % 4096 for token_num in tokens]
         
         return extracted_tokens
     
     def _generate_simulated_tokens(self, text: str) -> List[int]:
         """🎭 Genera token simulati per testing"""
         # Usa il testo e la voce per generare token deterministici
-        seed_text = f"{text}_{self.settings.voice.value}"
-        seed = hashlib.md5(seed_text.encode()).hexdigest()
-        
-        import random
-        random.seed(int(seed[:8], 16))
+        h = hashlib.blake2b(text.encode(), digest_size=16)
+        h.update(b'\0')
+        h.update(self._runtime.voice.encode())
         
-        # Genera circa 10-20 token per parola
+        seed = int.from_bytes(h.digest()[:4], 'little')
         words = text.split()
-        num_tokens = len(words) * random.randint(10, 20)
         
-        # Genera token ID nel range 0-4095
-        token_ids = []
-        for _ in range(num_tokens):
-            token_id = random.randint(0, 4095)
-            token_ids.append(token_id)
+        if np is not None:
+            # Un solo generatore: 10-20 token per parola, ID nel range 0-4095 in un buffer unico
+            rng = np.random.default_rng(seed)
+            num_tokens = len(words) * int(rng.integers(10, 21))
+            token_ids = rng.integers(0, 4096, size=num_tokens, dtype=np.int16).tolist()
+        else:
+            random.seed(seed)
+            
+            # Genera circa 10-20 token per parola
+            num_tokens = len(words) * random.randint(10, 20)
+            
+            # Genera token ID nel range 0-4095
+            token_ids = []
+            for _ in range(num_tokens):
+                token_id = random.randint(0, 4095)
+                token_ids.append(token_id)
         
         if self.settings.enable_debug:
             log.info(f"🎭 Token simulati generati: {len(token_ids)}")
         
         return token_ids
     
-    def _convert_tokens_to_audio(self, tokens: List[int]) -> Optional[bytes]:
-        """🎵 Converte token in audio usando approccio diretto del workspace core"""
+    def _render_chunk(self, chunk_sum: int, duration: float, out: 'np.ndarray') -> None:
+        """🎼 Scrive in place in out la sinusoide di un chunk (frequenza dalla somma dei token)"""
+        base_freq = 200 + (chunk_sum % 400)  # 200-600 Hz
+        t = np.linspace(0, duration, len(out))
+        np.multiply(t, 2 * np.pi * base_freq, out=out)
+        np.sin(out, out=out)
+        out *= 0.2
+    
+    def _iter_token_chunks(self, batches: Iterable[List[int]], chunk_size: int) -> Iterator[List[int]]:
+        """🧩 Raggruppa blocchi di token di lunghezza qualsiasi in chunk da chunk_size"""
+        pending: List[int] = []
+        for batch in batches:
+            pending.extend(batch)
+            if len(pending) >= chunk_size:
+                full = len(pending) - len(pending) % chunk_size
+                for i in range(0, full, chunk_size):
+                    yield pending[i:i + chunk_size]
+                del pending[:full]
+        if pending:
+            yield pending
+    
+    def _iter_pcm_chunks(self, batches: Iterable[List[int]]) -> Iterator[bytes]:
+        """🌊 Converte blocchi di token in blocchi PCM 16 bit, un chunk alla volta"""
+        chunk_size = 50  # Token per chunk
+        # Un solo buffer dal pool, riusato per tutti i chunk (al massimo chunk_size token)
+        buffer = _acquire_audio_buffer(int(self._runtime.sample_rate * chunk_size * 0.02)) if np is not None else None
+        try:
+            for chunk in self._iter_token_chunks(batches, chunk_size):
+                chunk_duration = len(chunk) * 0.02  # 20ms per token
+                chunk_samples = int(self._runtime.sample_rate * chunk_duration)
+                if buffer is not None:
+                    chunk_audio = buffer[:chunk_samples]
+                    self._render_chunk(sum(chunk), chunk_duration, chunk_audio)
+                    chunk_audio *= 32767
+                    yield chunk_audio.astype('<i2').tobytes()
+                else:
+                    yield bytes(2 * chunk_samples)
+        finally:
+            if buffer is not None:
+                _release_audio_buffer(buffer)
+    
+    def _convert_tokens_to_audio(self, tokens: List[int]) -> Optional[Tuple[Any, int]]:
+        """🎵 Converte token in PCM 16 bit: (array int16 o bytes senza numpy, sample rate)"""
         if not tokens:
             return None
         
         try:
-            # Approccio semplificato dal workspace core: processa token in chunk
-            chunk_size = 50  # Token per chunk
-            audio_chunks = []
-            
-            for i in range(0, len(tokens), chunk_size):
-                chunk = tokens[i:i + chunk_size]
-                # Simula elaborazione chunk -> audio
-                chunk_duration = len(chunk) * 0.02  # 20ms per token
-                chunk_samples = int(self.settings.sample_rate * chunk_duration)
+            if np is not None:
+                # Parametri di tutti i chunk da 50 token in un colpo solo
+                chunk_size = 50  # Token per chunk
+                starts = np.arange(0, len(tokens), chunk_size)
+                chunk_sums = np.add.reduceat(np.asarray(tokens, dtype=np.int64), starts)
+                durations = np.diff(np.append(starts, len(tokens))) * 0.02  # 20ms per token
+                bounds = np.concatenate(([0], np.cumsum((self._runtime.sample_rate * durations).astype(np.int64))))
                 
-                # Genera chunk audio semplice basato sui token
-                if np is not None:
-                    # Usa i valori dei token per modulare frequenza
-                    base_freq = 200 + (sum(chunk) % 400)  # 200-600 Hz
-                    t = np.linspace(0, chunk_duration, chunk_samples)
-                    chunk_audio = np.sin(2 * np.pi * base_freq * t) * 0.2
-                    audio_chunks.append(chunk_audio)
-                else:
-                    # Fallback: silenzio senza numpy
-                    silence = [0] * chunk_samples
-                    audio_chunks.append(silence)
-            
-            # Combina tutti i chunk
-            if np is not None and audio_chunks:
-                combined_audio = np.concatenate(audio_chunks)
-                audio_int16 = (combined_audio * 32767).astype(np.int16)
-                audio_bytes = self._create_wav_header(audio_int16, self.settings.sample_rate)
+                # Un solo buffer float32 dal pool: ogni chunk scrive nella propria fetta, niente concatenate
+                buffer = _acquire_audio_buffer(int(bounds[-1]))
+                try:
+                    audio = buffer[:int(bounds[-1])]
+                    for chunk_sum, duration, begin, end in zip(chunk_sums.tolist(), durations.tolist(),
+                                                               bounds[:-1].tolist(), bounds[1:].tolist()):
+                        self._render_chunk(chunk_sum, duration, audio[begin:end])
+                    np.multiply(audio, 32767, out=audio)
+                    audio_int16 = audio.astype('<i2')
+                finally:
+                    _release_audio_buffer(buffer)
                 
                 if self.settings.enable_debug:
-                    log.info(f"🎵 Audio da {len(tokens)} token in {len(audio_chunks)} chunk: {len(audio_bytes)} bytes")
+                    log.info(f"🎵 Audio da {len(tokens)} token in {len(starts)} chunk: {audio_int16.nbytes} bytes")
                 
-                return audio_bytes
+                return audio_int16, self._runtime.sample_rate
             else:
                 # Fallback completo
                 duration = len(tokens) * 0.02
-                num_samples = int(self.settings.sample_rate * duration)
-                silence = b'\x00\x00' * num_samples
-                return self._create_wav_header_raw(silence, self.settings.sample_rate)
+                num_samples = int(self._runtime.sample_rate * duration)
+                silence = bytes(2 * num_samples)
+                return silence, self._runtime.sample_rate
                 
         except Exception as e:
             log.error(f"🚨 Errore conversione audio: {str(e)}")
             return None
     
-    def _create_wav_header(self, audio_data: 'np.ndarray', sample_rate: int) -> bytes:
-        """🎧 Crea header WAV per i dati audio"""
-        if np is None:
-            return b''
-        
-        # Parametri WAV
-        channels = 1
-        bits_per_sample = 16
-        byte_rate = sample_rate * channels * bits_per_sample // 8
-        block_align = channels * bits_per_sample // 8
-        data_size = len(audio_data) * 2  # 2 bytes per sample
-        file_size = 36 + data_size
-        
-        # Header WAV
-        header = b'RIFF'
-        header += file_size.to_bytes(4, 'little')
-        header += b'WAVE'
-        header += b'fmt '
-        header += (16).to_bytes(4, 'little')  # fmt chunk size
-        header += (1).to_bytes(2, 'little')   # audio format (PCM)
-        header += channels.to_bytes(2, 'little')
-        header += sample_rate.to_bytes(4, 'little')
-        header += byte_rate.to_bytes(4, 'little')
-        header += block_align.to_bytes(2, 'little')
-        header += bits_per_sample.to_bytes(2, 'little')
-        header += b'data'
-        header += data_size.to_bytes(4, 'little')
-        
-        return header + audio_data.tobytes()
-    
-    def _create_wav_header_raw(self, audio_data: bytes, sample_rate: int) -> bytes:
-        """🎧 Crea header WAV per dati audio raw"""
-        channels = 1
-        bits_per_sample = 16
-        byte_rate = sample_rate * channels * bits_per_sample // 8
-        block_align = channels * bits_per_sample // 8
-        data_size = len(audio_data)
-        file_size = 36 + data_size
-        
-        # Header WAV
-        header = b'RIFF'
-        header += file_size.to_bytes(4, 'little')
-        header += b'WAVE'
-        header += b'fmt '
-        header += (16).to_bytes(4, 'little')
-        header += (1).to_bytes(2, 'little')
-        header += channels.to_bytes(2, 'little')
-        header += sample_rate.to_bytes(4, 'little')
-        header += byte_rate.to_bytes(4, 'little')
-        header += block_align.to_bytes(2, 'little')
-        header += bits_per_sample.to_bytes(2, 'little')
-        header += b'data'
-        header += data_size.to_bytes(4, 'little')
-        
-        return header + audio_data
-    
     def clean_text(self, text: str) -> str:
         """🧹 Pulisce il testo per TTS ottimale"""
         if not text:
             return ""
         
-        # Rimuovi tag HTML/Markdown
-        text = re.sub(r'<[^>]+>', '', text)
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)
-        text = re.sub(r'`([^`]+)`', r'\1', text)
+        # Testo già pulito (caso comune con output LLM): una sola passata
+        if not _RE_NEEDS_CLEAN.search(text):
+            return ' '.join(text.split())
         
-        # Rimuovi caratteri speciali problematici
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text)
+        # Rimuovi tag HTML/Markdown
+        text = _RE_HTML_TAG.sub('', text)
+        text = _RE_BOLD.sub(r'\1', text)
+        text = _RE_ITALIC.sub(r'\1', text)
+        text = _RE_CODE.sub(r'\1', text)
         
-        # Normalizza punteggiatura
-        text = re.sub(r'[…]', '...', text)
-        text = re.sub(r'["""]', '"', text)
-        text = re.sub(r"[''']", "'", text)
+        # Normalizza punteggiatura e rimuovi caratteri speciali problematici
+        text = text.translate(_PUNCTUATION_TABLE)
         
         # Normalizza spazi
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        text = ' '.join(text.split())
         
         # Gestisci abbreviazioni comuni
-        text = re.sub(r'\bDr\.', 'Dottore', text)
-        text = re.sub(r'\bProf\.', 'Professore', text)
-        text = re.sub(r'\bSig\.', 'Signore', text)
-        text = re.sub(r'\bSig\.ra', 'Signora', text)
+        for pattern, replacement in _ABBREVIATIONS:
+            text = pattern.sub(replacement, text)
         
         # Migliora pronuncia numeri
-        text = re.sub(r'\b(\d+)°', r'\1 gradi', text)
-        text = re.sub(r'\b(\d+)%', r'\1 percento', text)
+        for pattern, replacement in _NUMBER_SYMBOLS:
+            text = pattern.sub(replacement, text)
         
         return text
     
@@ -397,35 +715,58 @@ class OrpheusEngine:
         if not self.cache_enabled:
             return None
         
+        try:
+            return self._cached_audio_index(
+                text,
+                self._runtime.voice,
+                self._runtime.emotion,
+                self._runtime.speed,
+                self._runtime.format,
+                self._cache_version,
+            )
+        except FileNotFoundError:
+            return None
+    
+    def _lookup_cached_audio(self, text: str, voice: str, emotion: str, speed: float,
+                             fmt: str, cache_version: int) -> str:
+        """🔎 Percorso del file in cache; solleva FileNotFoundError se assente
+        
+        lru_cache non memorizza le eccezioni: i miss vengono ricontrollati
+        su disco alla richiesta successiva, gli hit restano in memoria.
+        """
         # Genera hash del testo + settings
         cache_key = self._generate_cache_key(text)
-        cache_file = self.cache_dir / f"{cache_key}.{self.settings.format.value}"
+        cache_file = self.cache_dir / f"{cache_key}.{fmt}"
         
-        if cache_file.exists():
-            return str(cache_file)
+        if not cache_file.exists():
+            raise FileNotFoundError(cache_file)
         
-        return None
+        return str(cache_file)
     
     def _generate_cache_key(self, text: str) -> str:
         """🔑 Genera chiave cache basata su testo e settings"""
-        # Combina testo e parametri rilevanti
-        cache_data = {
-            "text": text,
-            "voice": self.settings.voice.value,
-            "emotion": self.settings.emotion.value,
-            "speed": self.settings.speed,
-            "format": self.settings.format.value
-        }
-        
-        # Genera hash MD5
-        cache_string = json.dumps(cache_data, sort_keys=True)
-        return hashlib.md5(cache_string.encode()).hexdigest()
+        # Hash BLAKE2b dei campi rilevanti, separati da \0, senza passare da JSON
+        h = hashlib.blake2b(digest_size=16)
+        h.update(text.encode())
+        h.update(b'\0')
+        h.update(self._runtime.voice.encode())
+        h.update(b'\0')
+        h.update(self._runtime.emotion.encode())
+        h.update(b'\0')
+        h.update(struct.pack('<d', self._runtime.speed))
+        h.update(self._runtime.format.encode())
+        return h.hexdigest()
     
     def _copy_cached_file(self, cached_file: str, output_file: str) -> bool:
-        """📋 Copia file dalla cache alla destinazione"""
+        """📋 Copia file dalla cache alla destinazione (hardlink se possibile)"""
         try:
-            import shutil
-            shutil.copy2(cached_file, output_file)
+            _remove_if_exists(output_file)
+            try:
+                # Stesso contenuto della cache: un hardlink non copia nulla
+                os.link(cached_file, output_file)
+            except OSError:
+                # Filesystem diversi o link non supportati
+                shutil.copy2(cached_file, output_file)
             return True
         except Exception as e:
             log.error(f"🚨 Errore copia cache: {str(e)}")
@@ -438,30 +779,45 @@ class OrpheusEngine:
         
         try:
             cache_key = self._generate_cache_key(text)
-            cache_file = self.cache_dir / f"{cache_key}.{self.settings.format.value}"
+            cache_file = self.cache_dir / f"{cache_key}.{self._runtime.format}"
             
-            import shutil
-            shutil.copy2(audio_file, str(cache_file))
+            _copy_file(audio_file, str(cache_file))
             
             if self.settings.enable_debug:
                 log.info(f"💾 Audio salvato in cache: {cache_key}")
         except Exception as e:
             log.error(f"🚨 Errore salvataggio cache: {str(e)}")
     
+    def invalidate_cache_index(self) -> None:
+        """♻️ Invalida l'indice in memoria della cache audio (es. dopo pulizia della directory)"""
+        self._cache_version += 1
+    
+    def _start_request(self) -> None:
+        """📊 Registra l'inizio di una richiesta"""
+        with self._stats_lock:
+            self._stats.requests_total += 1
+            self._stats.last_request = datetime.now().isoformat()
+    
+    def _count(self, *names: str) -> None:
+        """📊 Incrementa i contatori indicati"""
+        with self._stats_lock:
+            for name in names:
+                setattr(self._stats, name, getattr(self._stats, name) + 1)
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """📊 Alias in sola lettura di get_stats()"""
+        return self.get_stats()
+    
     def get_stats(self) -> Dict[str, Any]:
         """📊 Restituisce statistiche del motore"""
-        return self.stats.copy()
+        with self._stats_lock:
+            return self._stats.as_dict()
     
     def reset_stats(self) -> None:
         """🔄 Reset statistiche"""
-        self.stats = {
-            "requests_total": 0,
-            "requests_success": 0,
-            "requests_failed": 0,
-            "cache_hits": 0,
-            "tokens_generated": 0,
-            "last_request": None
-        }
+        with self._stats_lock:
+            self._stats = _Stats()
     
     def health_check(self) -> Dict[str, Any]:
         """🏥 Controllo salute del motore"""
@@ -476,8 +832,8 @@ class OrpheusEngine:
         
         try:
             # Test connessione Ollama
-            response = requests.get(
-                f"{self.settings.ollama_url.rstrip('/v1')}/api/tags",
+            response = self._session.get(
+                self._tags_url,
                 timeout=5
             )
             if response.status_code == 200:
@@ -492,6 +848,18 @@ class OrpheusEngine:
             health["last_error"] = str(e)
         
         return health
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """🛑 Ferma il pool di thread; con wait=True attende le sintesi in corso"""
+        self._executor.shutdown(wait=wait)
+    
+    def close(self) -> None:
+        """🔌 Chiude la sessione HTTP e le connessioni verso Ollama
+        
+        Non blocca: le sintesi già accodate terminano in background.
+        """
+        self.shutdown(wait=False)
+        self._session.close()
 
 
 # === FUNZIONI UTILITY ===
@@ -505,7 +873,10 @@ def test_engine_connection(settings: OrpheusSettings) -> bool:
     """🔍 Test connessione motore"""
     try:
         engine = OrpheusEngine(settings)
-        health = engine.health_check()
+        try:
+            health = engine.health_check()
+        finally:
+            engine.close()
         return health["status"] == "healthy"
     except Exception:
         return False
@@ -4,12 +4,25 @@ Modulo per la gestione delle configurazioni del plugin Orpheus TTS.
 Contiene tutte le impostazioni, enum e validazioni per il plugin.
 """
 
+import functools
+import re
+import sys
+from dataclasses import dataclass
+from types import MappingProxyType
+
 from pydantic import BaseModel, Field, field_validator
 from enum import Enum
-from typing import Optional
+from typing import Literal, Optional, TypedDict
+
+try:
+    from enum import StrEnum
+except ImportError:  # Python < 3.11
+    class StrEnum(str, Enum):
+        """🔤 Equivalente minimo di enum.StrEnum: str() restituisce il valore"""
+        __str__ = str.__str__
 
 
-class OrpheusVoice(str, Enum):
+class OrpheusVoice(StrEnum):
     """🎵 Enum per le voci disponibili in Orpheus"""
     tara = "tara"           # Femminile, espressiva, versatile
     alex = "alex"           # Maschile, professionale, chiara
@@ -21,7 +34,11 @@ class OrpheusVoice(str, Enum):
     echo = "echo"           # Speciale, effetti unici
 
 
-class OrpheusEmotion(str, Enum):
+AVAILABLE_VOICES: tuple[str, ...] = tuple(voice.value for voice in OrpheusVoice)
+VOICE_SET: frozenset[str] = frozenset(AVAILABLE_VOICES)  # Test di appartenenza senza costruire l'enum
+
+
+class OrpheusEmotion(StrEnum):
     """😊 Enum per le emozioni supportate"""
     neutral = "neutral"         # Tono neutro, standard
     happy = "happy"             # Allegro, positivo
@@ -32,7 +49,11 @@ class OrpheusEmotion(str, Enum):
     mysterious = "mysterious"   # Misterioso, intrigante
 
 
-class OrpheusFormat(str, Enum):
+AVAILABLE_EMOTIONS: tuple[str, ...] = tuple(emotion.value for emotion in OrpheusEmotion)
+EMOTION_SET: frozenset[str] = frozenset(AVAILABLE_EMOTIONS)
+
+
+class OrpheusFormat(StrEnum):
     """📁 Enum per i formati audio supportati"""
     mp3 = "mp3"     # Formato compresso, compatibile
     wav = "wav"     # Formato non compresso, alta qualità
@@ -40,21 +61,141 @@ class OrpheusFormat(str, Enum):
     opus = "opus"   # Formato moderno, efficiente
 
 
-class OrpheusMode(str, Enum):
+AVAILABLE_FORMATS: tuple[str, ...] = tuple(fmt.value for fmt in OrpheusFormat)
+FORMAT_SET: frozenset[str] = frozenset(AVAILABLE_FORMATS)
+
+
+class OrpheusMode(StrEnum):
     """⚡ Enum per le modalità di funzionamento"""
     ollama_direct = "ollama_direct"     # Integrazione diretta Ollama + SNAC
 
 
-class OrpheusModel(str, Enum):
+# Tag Ollama del modello Orpheus, unica copia condivisa della stringa
+_ORPHEUS_MODEL_TAG = sys.intern("hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0")
+
+
+class OrpheusModel(StrEnum):
     """🤖 Enum per i modelli Orpheus disponibili"""
-    # Modello principale inglese - TESTATO E FUNZIONANTE
-    english_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"
-    italian_spanish_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"    # Italiano/Spagnolo, 3B
-    korean_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"             # Coreano, 3B parametri
-    french_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"             # Francese, 3B parametri
-    german_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"             # Tedesco, 3B parametri
-    chinese_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"            # Cinese, 3B parametri
-    hindi_3b = "hf.co/unsloth/orpheus-3b-0.1-ft-GGUF:Q8_0"              # Hindi, 3B parametri
+    # Modello multilingua 3B (GGUF Q8_0) - TESTATO E FUNZIONANTE
+    unsloth_3b = _ORPHEUS_MODEL_TAG
+
+
+AVAILABLE_MODELS: tuple[str, ...] = tuple(model.value for model in OrpheusModel)
+
+
+class OrpheusLanguage(StrEnum):
+    """🌍 Enum per le lingue del modello Orpheus"""
+    english = "english"                     # Inglese, modello principale
+    italian_spanish = "italian_spanish"     # Italiano/Spagnolo
+    korean = "korean"                       # Coreano
+    french = "french"                       # Francese
+    german = "german"                       # Tedesco
+    chinese = "chinese"                     # Cinese mandarino
+    hindi = "hindi"                         # Hindi
+
+
+AVAILABLE_LANGUAGES: tuple[str, ...] = tuple(language.value for language in OrpheusLanguage)
+
+
+# === URL OLLAMA ===
+
+# Schema http(s) e host obbligatori; un eventuale percorso (es. reverse proxy) è ammesso
+_OLLAMA_URL_RE = re.compile(r'https?://[^/\s]+(?:/\S*)?')
+
+
+@functools.lru_cache(maxsize=32)
+def _normalize_ollama_url(url: str) -> str:
+    """🔗 Valida l'URL Ollama e lo normalizza con suffisso /v1 (risultato in cache)"""
+    if not _OLLAMA_URL_RE.fullmatch(url):
+        raise ValueError('URL deve iniziare con http:// o https:// seguito da un host')
+    url = url.rstrip('/')
+    return url if url.endswith('/v1') else url + '/v1'
+
+
+# === DESCRIZIONI ===
+
+# Chiavi stringa: con use_enum_values i campi contengono già il valore, e gli
+# enum (str, Enum) trovano comunque la stessa voce
+_VOICE_DESC = {
+    "tara": "Femminile, espressiva, versatile",
+    "alex": "Maschile, professionale, chiara",
+    "sarah": "Femminile, dolce, calda",
+    "emma": "Femminile, giovane, energica",
+    "daniel": "Maschile, seria, autorevole",
+    "michael": "Maschile, profonda, sicura",
+    "nova": "Femminile, moderna, tecnologica",
+    "echo": "Speciale, effetti unici",
+}
+
+_EMOTION_DESC = {
+    "neutral": "Tono neutro, standard",
+    "happy": "Allegro, positivo",
+    "sad": "Triste, malinconico",
+    "angry": "Arrabbiato, intenso",
+    "excited": "Eccitato, entusiasta",
+    "calm": "Calmo, rilassato",
+    "mysterious": "Misterioso, intrigante",
+}
+
+# Un solo modello: la descrizione dipende dalla lingua
+_MODEL_DESC = {
+    "english": "Modello inglese principale (3B parametri)",
+    "italian_spanish": "Modello italiano/spagnolo (raccomandato per italiano)",
+    "korean": "Modello coreano specializzato",
+    "french": "Modello francese specializzato",
+    "german": "Modello tedesco specializzato",
+    "chinese": "Modello cinese mandarino specializzato",
+    "hindi": "Modello hindi specializzato",
+}
+
+
+class OrpheusSettingsDict(TypedDict, total=False):
+    """📋 Forma a dizionario di OrpheusSettings (valori enum come stringhe)"""
+    ollama_url: str
+    ollama_model: str
+    language: str
+    voice: str
+    emotion: str
+    speed: float
+    format: str
+    mode: str
+    enable_tts: bool
+    enable_emotional_synthesis: bool
+    sample_rate: int
+    bit_depth: int
+    timeout_seconds: int
+    max_text_length: int
+    custom_voice_path: Optional[str]
+    voice_temperature: float
+    enable_debug: bool
+    save_audio_files: bool
+    audio_cache_enabled: bool
+
+
+@dataclass(frozen=True)
+class OrpheusRuntimeConfig:
+    """🏃 Vista immutabile dei soli campi letti dal motore durante la sintesi
+
+    Accesso diretto agli slot, senza passare dai descrittori Pydantic.
+    Gli enum sono già convertiti in stringhe semplici.
+    """
+    # __slots__ esplicito: dataclass(slots=True) richiede Python 3.10, il plugin supporta 3.9+
+    __slots__ = ("voice", "emotion", "speed", "format", "sample_rate", "bit_depth",
+                 "enable_emotional_synthesis", "timeout_seconds")
+
+    voice: str
+    emotion: str
+    speed: float
+    format: str
+    sample_rate: int
+    bit_depth: int
+    enable_emotional_synthesis: bool
+    timeout_seconds: int
+
+
+# Valori calcolati pigramente e salvati in __dict__ dell'istanza: model_copy li
+# copierebbe insieme ai campi, quindi vanno scartati quando cambia qualche valore
+_CACHED_ATTRIBUTES = ("voice_description", "emotion_description", "_debug_str")
 
 
 class OrpheusSettings(BaseModel):
@@ -71,10 +212,15 @@ class OrpheusSettings(BaseModel):
     )
     
     ollama_model: OrpheusModel = Field(
-        default=OrpheusModel.english_3b,
+        default=OrpheusModel.unsloth_3b,
         description="Modello Ollama da utilizzare per la generazione TTS"
     )
     
+    language: OrpheusLanguage = Field(
+        default=OrpheusLanguage.english,
+        description="Lingua del testo da sintetizzare"
+    )
+    
     # === PARAMETRI VOCALI ===
     voice: OrpheusVoice = Field(
         default=OrpheusVoice.tara,
@@ -105,6 +251,11 @@ class OrpheusSettings(BaseModel):
         description="Modalità di funzionamento del TTS"
     )
     
+    enable_tts: bool = Field(
+        default=True,
+        description="Abilita/disabilita completamente il TTS"
+    )
+    
     # === OPZIONI AVANZATE ===
     
     enable_emotional_synthesis: bool = Field(
@@ -113,12 +264,12 @@ class OrpheusSettings(BaseModel):
     )
     
     # === CONTROLLO QUALITÀ ===
-    sample_rate: int = Field(
+    sample_rate: Literal[8000, 16000, 22050, 44100, 48000] = Field(
         default=22050,
         description="Sample rate audio (Hz)"
     )
     
-    bit_depth: int = Field(
+    bit_depth: Literal[8, 16, 24, 32] = Field(
         default=16,
         description="Profondità bit audio"
     )
@@ -167,62 +318,28 @@ class OrpheusSettings(BaseModel):
         description="Abilita cache audio per testi ripetuti"
     )
     
-    @field_validator('ollama_url')
+    @field_validator('ollama_url', mode='before')
     @classmethod
     def validate_ollama_url(cls, v):
         """Valida che l'URL Ollama sia ben formato"""
-        if not v.startswith(('http://', 'https://')):
-            raise ValueError('URL deve iniziare con http:// o https://')
-        if not v.endswith('/v1'):
-            v = v.rstrip('/') + '/v1'
-        return v
-    
-    @field_validator('speed')
-    @classmethod
-    def validate_speed(cls, v):
-        """Valida velocità di riproduzione"""
-        if not 0.5 <= v <= 2.0:
-            raise ValueError('Velocità deve essere tra 0.5 e 2.0')
-        return v
-    
-    @field_validator('voice_temperature')
-    @classmethod
-    def validate_temperature(cls, v):
-        """Valida temperatura vocale"""
-        if not 0.1 <= v <= 1.0:
-            raise ValueError('Temperatura deve essere tra 0.1 e 1.0')
-        return v
-    
-    @field_validator('sample_rate')
-    @classmethod
-    def validate_sample_rate(cls, v):
-        """Valida sample rate audio"""
-        valid_rates = [8000, 16000, 22050, 44100, 48000]
-        if v not in valid_rates:
-            raise ValueError(f'Sample rate deve essere uno di: {valid_rates}')
-        return v
-    
-    @field_validator('bit_depth')
-    @classmethod
-    def validate_bit_depth(cls, v):
-        """Valida profondità bit"""
-        if v not in [8, 16, 24, 32]:
-            raise ValueError('Bit depth deve essere 8, 16, 24 o 32')
-        return v
+        if not isinstance(v, str):
+            return v  # Errore di tipo segnalato dal core pydantic
+        return _normalize_ollama_url(v)
     
     model_config = {
         "use_enum_values": True,
-        "validate_assignment": True,
+        "frozen": True,
         "extra": "forbid",
         "json_schema_extra": {
             "example": {
                 "ollama_url": "http://localhost:11434/v1",
-                "ollama_model": "italian_spanish_3b",
+                "ollama_model": _ORPHEUS_MODEL_TAG,
+                "language": "italian_spanish",
                 "voice": "tara",
                 "emotion": "neutral",
                 "speed": 1.0,
                 "format": "mp3",
-                "mode": "auto",
+                "mode": "ollama_direct",
                 "enable_emotional_synthesis": True,
                 "timeout_seconds": 30,
                 "enable_debug": False
@@ -230,95 +347,152 @@ class OrpheusSettings(BaseModel):
         }
     }
     
+    @functools.cached_property
+    def voice_description(self) -> str:
+        """🎵 Descrizione della voce selezionata, calcolata al primo accesso"""
+        return _VOICE_DESC.get(self.voice, "Voce sconosciuta")
+    
+    @functools.cached_property
+    def emotion_description(self) -> str:
+        """😊 Descrizione dell'emozione selezionata, calcolata al primo accesso"""
+        return _EMOTION_DESC.get(self.emotion, "Emozione sconosciuta")
+    
     def get_voice_description(self) -> str:
         """🎵 Restituisce descrizione della voce selezionata"""
-        voice_descriptions = {
-            OrpheusVoice.tara: "Femminile, espressiva, versatile",
-            OrpheusVoice.alex: "Maschile, professionale, chiara",
-            OrpheusVoice.sarah: "Femminile, dolce, calda",
-            OrpheusVoice.emma: "Femminile, giovane, energica",
-            OrpheusVoice.daniel: "Maschile, seria, autorevole",
-            OrpheusVoice.michael: "Maschile, profonda, sicura",
-            OrpheusVoice.nova: "Femminile, moderna, tecnologica",
-            OrpheusVoice.echo: "Speciale, effetti unici"
-        }
-        return voice_descriptions.get(self.voice, "Voce sconosciuta")
+        return self.voice_description
     
     def get_emotion_description(self) -> str:
         """😊 Restituisce descrizione dell'emozione selezionata"""
-        emotion_descriptions = {
-            OrpheusEmotion.neutral: "Tono neutro, standard",
-            OrpheusEmotion.happy: "Allegro, positivo",
-            OrpheusEmotion.sad: "Triste, malinconico",
-            OrpheusEmotion.angry: "Arrabbiato, intenso",
-            OrpheusEmotion.excited: "Eccitato, entusiasta",
-            OrpheusEmotion.calm: "Calmo, rilassato",
-            OrpheusEmotion.mysterious: "Misterioso, intrigante"
-        }
-        return emotion_descriptions.get(self.emotion, "Emozione sconosciuta")
+        return self.emotion_description
+    
+    @classmethod
+    def from_trusted_dict(cls, data: OrpheusSettingsDict) -> "OrpheusSettings":
+        """⚡ Crea settings senza validazione, da valori già validati a monte
+        
+        Il chiamante deve garantire che i valori siano validi e normalizzati
+        (es. ollama_url con /v1): usare validate_settings ai confini di fiducia.
+        """
+        return cls.model_construct(**data)
+    
+    def to_runtime(self) -> OrpheusRuntimeConfig:
+        """🏃 Config runtime per i percorsi caldi, costruita a ogni chiamata (il motore la conserva)"""
+        return OrpheusRuntimeConfig(
+            voice=str(self.voice),
+            emotion=str(self.emotion),
+            speed=self.speed,
+            format=str(self.format),
+            sample_rate=self.sample_rate,
+            bit_depth=self.bit_depth,
+            enable_emotional_synthesis=self.enable_emotional_synthesis,
+            timeout_seconds=self.timeout_seconds,
+        )
+    
+    def check_text(self, text: str) -> bool:
+        """📏 True se il testo rientra in max_text_length (unico punto di controllo)"""
+        return len(text) <= self.max_text_length
     
     def get_effective_mode(self) -> OrpheusMode:
         """⚡ Determina modalità effettiva basata su configurazione"""
-        if self.mode == OrpheusMode.auto:
-            return OrpheusMode.ollama_direct if self.use_ollama_direct else OrpheusMode.fastapi
-        return self.mode
+        # Unica modalità supportata: integrazione diretta Ollama
+        return OrpheusMode.ollama_direct
+    
+    def model_copy(self, *, update=None, deep: bool = False) -> "OrpheusSettings":
+        """📄 Come BaseModel.model_copy, ma senza i valori in cache se cambia qualcosa"""
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            for name in _CACHED_ATTRIBUTES:
+                copied.__dict__.pop(name, None)
+        return copied
     
     def to_dict(self) -> dict:
-        """📋 Converte settings in dizionario per logging/debug"""
-        return self.dict()
+        """📋 Converte settings in dizionario per logging/debug (solo valori modificati)"""
+        return self.model_dump(mode='python', exclude_defaults=True, exclude_unset=True)
+    
+    @functools.cached_property
+    def _debug_str(self) -> str:
+        """🔍 Stringa di __str__, costruita una sola volta (i settings sono immutabili)"""
+        return f"OrpheusSettings(voice={self.voice}, emotion={self.emotion}, mode={self.get_effective_mode()})"
     
     def __str__(self) -> str:
         """🔍 Rappresentazione stringa per debug"""
-        return f"OrpheusSettings(voice={self.voice}, emotion={self.emotion}, mode={self.get_effective_mode()})"
+        return self._debug_str
 
 
 # === FUNZIONI UTILITY ===
 
+@functools.lru_cache(maxsize=4)
+def get_settings_schema(mode: str = 'validation') -> dict:
+    """📋 JSON Schema di OrpheusSettings, generato una sola volta per modalità
+    
+    Il dizionario è condiviso: non va modificato.
+    """
+    return OrpheusSettings.model_json_schema(mode=mode)
+
+
+@functools.lru_cache(maxsize=1)
 def get_default_settings() -> OrpheusSettings:
-    """🏭 Factory per settings di default"""
+    """🏭 Factory per settings di default
+    
+    L'istanza è condivisa: per modificarla usare model_copy(update=...).
+    """
     return OrpheusSettings()
 
 
+@functools.lru_cache(maxsize=128)
+def _validate_settings_cached(frozen_items: tuple) -> OrpheusSettings:
+    """✅ Validazione memorizzata per configurazioni già viste"""
+    return OrpheusSettings.model_validate(dict(frozen_items))
+
+
 def validate_settings(settings_dict: dict) -> OrpheusSettings:
-    """✅ Valida e crea settings da dizionario"""
+    """✅ Valida e crea settings da dizionario
+    
+    Dizionari con gli stessi valori restituiscono la stessa istanza condivisa:
+    per modificarla usare model_copy(update=...).
+    """
     try:
-        return OrpheusSettings(**settings_dict)
+        try:
+            frozen_items = tuple(sorted(settings_dict.items()))
+            hash(frozen_items)
+        except TypeError:
+            # Valori non hashabili: nessuna cache
+            return OrpheusSettings.model_validate(settings_dict)
+        return _validate_settings_cached(frozen_items)
     except Exception as e:
         raise ValueError(f"Configurazione non valida: {str(e)}")
 
 
-def get_available_voices() -> list[str]:
+def get_available_voices() -> tuple[str, ...]:
     """🎵 Lista voci disponibili"""
-    return [voice.value for voice in OrpheusVoice]
+    return AVAILABLE_VOICES
 
 
-def get_available_emotions() -> list[str]:
+def get_available_emotions() -> tuple[str, ...]:
     """😊 Lista emozioni disponibili"""
-    return [emotion.value for emotion in OrpheusEmotion]
+    return AVAILABLE_EMOTIONS
 
 
-def get_available_formats() -> list[str]:
+def get_available_formats() -> tuple[str, ...]:
     """📁 Lista formati disponibili"""
-    return [format.value for format in OrpheusFormat]
+    return AVAILABLE_FORMATS
 
 
-def get_available_models() -> list[str]:
+def get_available_models() -> tuple[str, ...]:
     """🤖 Lista modelli disponibili"""
-    return [model.value for model in OrpheusModel]
-
-
-def get_model_description(model: OrpheusModel) -> str:
-    """🤖 Restituisce descrizione del modello"""
-    descriptions = {
-        OrpheusModel.english_3b: "Modello inglese principale (3B parametri)",
-        OrpheusModel.italian_spanish_3b: "Modello italiano/spagnolo (raccomandato per italiano)",
-        OrpheusModel.korean_3b: "Modello coreano specializzato",
-        OrpheusModel.french_3b: "Modello francese specializzato",
-        OrpheusModel.german_3b: "Modello tedesco specializzato",
-        OrpheusModel.chinese_3b: "Modello cinese mandarino specializzato",
-        OrpheusModel.hindi_3b: "Modello hindi specializzato"
-    }
-    return descriptions.get(model, "Modello sconosciuto")
+    return AVAILABLE_MODELS
+
+
+def get_available_languages() -> tuple[str, ...]:
+    """🌍 Lista lingue disponibili"""
+    return AVAILABLE_LANGUAGES
+
+
+def get_model_description(model: OrpheusModel,
+                          language: OrpheusLanguage = OrpheusLanguage.english) -> str:
+    """🤖 Restituisce descrizione del modello per la lingua indicata"""
+    if model not in AVAILABLE_MODELS:
+        return "Modello sconosciuto"
+    return _MODEL_DESC.get(language, "Modello sconosciuto")
 
 
 # === COSTANTI ===
@@ -329,17 +503,26 @@ DEFAULT_FORMAT = OrpheusFormat.mp3
 DEFAULT_SPEED = 1.0
 DEFAULT_TIMEOUT = 30
 
-# Mapping per compatibilità con Kokoro-Cat
-KOKORO_VOICE_MAPPING = {
-    "alloy": OrpheusVoice.alex,
-    "echo": OrpheusVoice.echo,
-    "fable": OrpheusVoice.sarah,
-    "onyx": OrpheusVoice.daniel,
-    "nova": OrpheusVoice.nova,
-    "shimmer": OrpheusVoice.emma
-}
+# Mapping per compatibilità con Kokoro-Cat, come valori stringa (sola lettura)
+_KOKORO_VOICE_STR = MappingProxyType({
+    "alloy": "alex",
+    "echo": "echo",
+    "fable": "sarah",
+    "onyx": "daniel",
+    "nova": "nova",
+    "shimmer": "emma"
+})
+
+_KOKORO_DEFAULT_VOICE_STR = DEFAULT_VOICE.value
+
+KOKORO_VOICE_MAPPING = {name: OrpheusVoice(voice) for name, voice in _KOKORO_VOICE_STR.items()}
+
+
+def map_kokoro_voice_str(kokoro_voice: str) -> str:
+    """🔄 Mappa voci Kokoro al valore della voce Orpheus, da usare nei dict di settings"""
+    return _KOKORO_VOICE_STR.get(kokoro_voice, _KOKORO_DEFAULT_VOICE_STR)
 
 
 def map_kokoro_voice(kokoro_voice: str) -> OrpheusVoice:
     """🔄 Mappa voci Kokoro a voci Orpheus per migrazione"""
-    return KOKORO_VOICE_MAPPING.get(kokoro_voice, DEFAULT_VOICE)
\ No newline at end of file
+    return KOKORO_VOICE_MAPPING.get(kokoro_voice, DEFAULT_VOICE)